@@ -0,0 +1,165 @@
+"""
+baseline.py - Personal Baseline Engine for Billy
+
+Philosophy: "Good sleep" and "high HRV" are relative to the body that produced them.
+This module keeps rolling 7/28/90-day statistics per metric so the pipeline and
+the HUD classify each day against the user's own history, not population averages.
+
+State is a plain JSON dict. Each update is amortized O(1): the value entering
+the window is added to running sums and values whose date has fallen out of
+the window are subtracted. Windows are calendar days ending at the last
+absorbed date, so after a gap the 7-day window holds only the days since.
+Backfilling an export is therefore a single linear pass over the days.
+"""
+
+import json
+import math
+from datetime import date, timedelta
+
+from fileio import atomic_write
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+BASELINE_WINDOWS = (7, 28, 90)     # Rolling windows (calendar days)
+CLASSIFY_WINDOW = 28               # Window used for status classification
+MIN_SAMPLES = 7                    # Below this, fall back to generic thresholds
+LOW_Z = -0.5                       # z-score below this counts as "below baseline"
+
+# Generic population thresholds (used until a personal baseline exists)
+FALLBACK_THRESHOLDS = {
+    "sleep_hours": 7.0,
+    "hrv": 50.0,
+}
+
+
+# =============================================================================
+# PERSISTENCE
+# =============================================================================
+
+def empty_metric_state() -> dict:
+    """Returns a fresh rolling state for one metric."""
+    return {
+        "last_date": None,
+        "history": [],                                   # [date, value] within max(window), oldest first
+        "counts": {str(w): 0 for w in BASELINE_WINDOWS}, # Trailing history entries inside each window
+        "sums": {str(w): 0.0 for w in BASELINE_WINDOWS},
+        "sumsqs": {str(w): 0.0 for w in BASELINE_WINDOWS},
+    }
+
+
+def load_baselines(path: str) -> dict:
+    """
+    Loads baseline state from disk. Returns empty state if missing/corrupt.
+    Metrics saved in the older days-with-data format are dropped, so the
+    next run rebuilds them from the export.
+    """
+    try:
+        with open(path, 'r') as f:
+            state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return {metric: s for metric, s in state.items() if "counts" in s}
+
+
+def save_baselines(path: str, state: dict) -> None:
+    """Persists baseline state (atomically - the server and HUD read it)."""
+    atomic_write(path, json.dumps(state, indent=2))
+
+
+# =============================================================================
+# INCREMENTAL UPDATE - O(1) per day
+# =============================================================================
+
+def update_baseline(state: dict, metric: str, date_key: str, value: float) -> bool:
+    """
+    Absorbs one day's value into the rolling windows for `metric`.
+    Days at or before the last absorbed date are ignored (idempotent re-runs).
+    Returns True if the value was absorbed.
+    """
+    metric_state = state.setdefault(metric, empty_metric_state())
+    last_date = metric_state["last_date"]
+    if last_date is not None and date_key <= last_date:
+        return False
+
+    history = metric_state["history"]
+    history.append([date_key, value])
+    today = date.fromisoformat(date_key)
+
+    for window in BASELINE_WINDOWS:
+        key = str(window)
+        metric_state["counts"][key] += 1
+        metric_state["sums"][key] += value
+        metric_state["sumsqs"][key] += value * value
+
+        # Evict values whose date fell out of this window (each leaves once)
+        cutoff = (today - timedelta(days=window)).isoformat()
+        while history[-metric_state["counts"][key]][0] <= cutoff:
+            old = history[-metric_state["counts"][key]][1]
+            metric_state["counts"][key] -= 1
+            metric_state["sums"][key] -= old
+            metric_state["sumsqs"][key] -= old * old
+
+    max_window = str(max(BASELINE_WINDOWS))
+    del history[:len(history) - metric_state["counts"][max_window]]
+
+    metric_state["last_date"] = date_key
+    return True
+
+
+# =============================================================================
+# STATISTICS
+# =============================================================================
+
+def get_baseline_stats(state: dict, metric: str, window: int = CLASSIFY_WINDOW) -> dict | None:
+    """
+    Returns {"n", "mean", "std"} for the given window (ending at the last
+    absorbed date), or None if no data.
+    """
+    metric_state = state.get(metric)
+    key = str(window)
+    if not metric_state or not metric_state["counts"][key]:
+        return None
+
+    n = metric_state["counts"][key]
+    mean = metric_state["sums"][key] / n
+    # Clamp tiny negatives from floating-point cancellation
+    variance = max(0.0, metric_state["sumsqs"][key] / n - mean * mean)
+    return {"n": n, "mean": mean, "std": math.sqrt(variance)}
+
+
+def get_zscore(state: dict, metric: str, value: float, window: int = CLASSIFY_WINDOW) -> float | None:
+    """
+    Returns the z-score of `value` against the metric's baseline.
+    None if the baseline is too thin (< MIN_SAMPLES) or flat (std == 0).
+    """
+    stats = get_baseline_stats(state, metric, window)
+    if stats is None or stats["n"] < MIN_SAMPLES or stats["std"] == 0:
+        return None
+    return (value - stats["mean"]) / stats["std"]
+
+
+def is_above_baseline(state: dict, metric: str, value: float) -> bool:
+    """
+    Classifies a value as normal-or-better (True) vs. below baseline (False).
+    Falls back to generic thresholds until enough personal history exists.
+    """
+    return is_above_zscore(metric, value, get_zscore(state, metric, value))
+
+
+def is_above_zscore(metric: str, value: float, z: float | None) -> bool:
+    """
+    Same classification from an already computed z-score (None -> generic threshold).
+    """
+    if z is None:
+        return value > FALLBACK_THRESHOLDS[metric]
+    return z >= LOW_Z
+
+
+def format_zscore(z: float | None) -> str:
+    """Formats a z-score for notes: 'z=+0.4' or '' if unavailable."""
+    if z is None:
+        return ""
+    return f"z={z:+.1f}"
@@ -0,0 +1,233 @@
+"""
+batch.py - Multi-User Batch Runner for Billy
+
+Runs the pipeline for many people's exports in parallel with a bounded
+process pool. Each user is isolated: own export, output dir and cache dir,
+own log file, and a failure in one user never stops the others. If a worker
+process dies outright (e.g. OOM-killed), the pool breaks and every pending
+user with it; those users are re-run, each in its own single-process pool,
+so only the one that kills its worker is reported as failed.
+
+Manifest (JSON, relative paths resolve against the manifest's directory):
+{
+  "users": [
+    {
+      "name": "alice",
+      "export": "alice/export.xml",
+      "output_dir": "alice/daily_notes",
+      "cache_dir": "alice/cache",
+      "concepts_dir": "alice/concepts",     (optional)
+      "timeseries_dir": "alice/timeseries"  (optional)
+    }
+  ]
+}
+
+Usage: python src/batch.py manifest.json [--workers N] [--report report.json]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+# =============================================================================
+# IMPORT FIX: Ensure pipeline.py is importable
+# =============================================================================
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+from pipeline import parse_health_data
+from clock import get_timestamp
+
+
+# =============================================================================
+# MANIFEST
+# =============================================================================
+
+REQUIRED_FIELDS = ("name", "export", "output_dir", "cache_dir")
+PATH_FIELDS = ("export", "output_dir", "cache_dir", "concepts_dir", "timeseries_dir")
+
+
+def load_manifest(manifest_path: str) -> list[dict]:
+    """
+    Loads and validates the user manifest. Raises ValueError on bad entries.
+    """
+    with open(manifest_path, 'r') as f:
+        manifest = json.load(f)
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    users = []
+    seen = set()
+
+    for i, entry in enumerate(manifest.get("users", [])):
+        missing = [field for field in REQUIRED_FIELDS if not entry.get(field)]
+        if missing:
+            raise ValueError(f"Manifest entry {i}: missing {', '.join(missing)}")
+        if entry["name"] in seen:
+            raise ValueError(f"Manifest entry {i}: duplicate name '{entry['name']}'")
+        seen.add(entry["name"])
+
+        user = dict(entry)
+        for field in PATH_FIELDS:
+            if user.get(field):
+                user[field] = os.path.join(base_dir, user[field])
+        users.append(user)
+
+    return users
+
+
+# =============================================================================
+# WORKER (runs in a child process)
+# =============================================================================
+
+def process_user(user: dict) -> dict:
+    """
+    Runs the pipeline for one user. Never raises: failures are returned
+    in the result so the pool keeps going. Output goes to cache_dir/pipeline.log.
+    """
+    started = time.perf_counter()
+    result = {"name": user["name"], "status": "ok", "error": None, "stats": None}
+
+    try:
+        os.makedirs(user["cache_dir"], exist_ok=True)
+        log_path = os.path.join(user["cache_dir"], "pipeline.log")
+        with open(log_path, 'w') as log, contextlib.redirect_stdout(log):
+            result["stats"] = parse_health_data(
+                user["export"],
+                output_dir=user["output_dir"],
+                cache_dir=user["cache_dir"],
+                concepts_dir=user.get("concepts_dir"),
+                timeseries_dir=user.get("timeseries_dir"),
+            )
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["traceback"] = traceback.format_exc()
+
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def failed_result(user: dict, error: Exception) -> dict:
+    """Result for a user whose worker couldn't return one (e.g. the process died)."""
+    return {"name": user["name"], "status": "failed", "error": f"{type(error).__name__}: {error}", "stats": None, "seconds": None}
+
+
+def process_user_isolated(user: dict) -> dict:
+    """
+    Runs one user in a private single-process pool, so a worker that dies
+    only takes this user down. Called from threads in the parent.
+    """
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        try:
+            return pool.submit(process_user, user).result()
+        except BrokenProcessPool as e:
+            return failed_result(user, e)
+
+
+# =============================================================================
+# POOL
+# =============================================================================
+
+def export_size(user: dict) -> int:
+    """Export size in bytes (0 if missing) - used to schedule big jobs first."""
+    try:
+        return os.path.getsize(user["export"])
+    except OSError:
+        return 0
+
+
+def print_result(result: dict) -> None:
+    """One progress line per finished user."""
+    icon = "✅" if result["status"] == "ok" else "❌"
+    detail = result["error"] or f"{result['stats']['notes_written']} notes, {result['stats']['days']} days"
+    print(f"  {icon} {result['name']:<20} {result['seconds'] or 0:>7.2f}s  {detail}")
+
+
+def run_batch(users: list[dict], workers: int | None = None) -> dict:
+    """
+    Processes all users with at most `workers` processes (default: all cores).
+    Largest exports are submitted first so the pool drains evenly.
+    Returns the summary report.
+    """
+    workers = max(1, min(workers or os.cpu_count() or 1, len(users) or 1))
+    started = time.perf_counter()
+    results = []
+    unfinished = []
+
+    print(f"🚀 Batch run: {len(users)} users, {workers} workers ({get_timestamp()})")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(process_user, user): user
+            for user in sorted(users, key=export_size, reverse=True)
+        }
+        for future in as_completed(futures):
+            user = futures[future]
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                # A worker died abruptly and the pool failed every pending
+                # future with it - we can't tell whose fault it was yet
+                unfinished.append(user)
+                continue
+            except Exception as e:
+                result = failed_result(user, e)
+            results.append(result)
+            print_result(result)
+
+    if unfinished:
+        print(f"⚠️  Worker pool broke; re-running {len(unfinished)} users in isolation")
+        with ThreadPoolExecutor(max_workers=workers) as threads:
+            for result in threads.map(process_user_isolated, unfinished):
+                results.append(result)
+                print_result(result)
+
+    results.sort(key=lambda r: r["name"])
+    failed = [r["name"] for r in results if r["status"] != "ok"]
+    report = {
+        "timestamp": get_timestamp(),
+        "workers": workers,
+        "wall_seconds": round(time.perf_counter() - started, 3),
+        "summed_user_seconds": round(sum(r["seconds"] or 0 for r in results), 3),
+        "retried": sorted(user["name"] for user in unfinished),
+        "users": len(results),
+        "failed": failed,
+        "results": results,
+    }
+
+    print(f"\n--- Batch Summary ---")
+    print(f"Wall time: {report['wall_seconds']:.2f}s | Summed user time: {report['summed_user_seconds']:.2f}s")
+    print(f"Succeeded: {len(results) - len(failed)}/{len(results)}")
+    if failed:
+        print(f"⚠️  Failed: {', '.join(failed)}")
+
+    return report
+
+
+# =============================================================================
+# ENTRY POINT
+# =============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Billy pipeline for many users in parallel.")
+    parser.add_argument("manifest", help="Path to the users manifest (JSON)")
+    parser.add_argument("--workers", type=int, default=None, help="Max worker processes (default: CPU count)")
+    parser.add_argument("--report", default=None, help="Write the JSON summary report here")
+    args = parser.parse_args()
+
+    report = run_batch(load_manifest(args.manifest), args.workers)
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Report: {args.report}")
+
+    sys.exit(1 if report["failed"] else 0)
@@ -0,0 +1,132 @@
+"""
+fileio.py - Safe Note Writes for Billy
+
+The pipeline, watch mode and any number of chat sessions can touch the same
+daily note. Every write here is:
+- Locked: an exclusive flock on a hidden sidecar (.<note>.lock) serializes
+  read-modify-write cycles across processes.
+- Atomic: content goes to a temp file in the same directory, is fsynced, then
+  os.replace()d over the note, so readers (Obsidian, server.py) never see
+  a half-written file.
+
+On platforms without fcntl the lock degrades to a no-op; writes stay atomic.
+"""
+
+import os
+import stat
+import tempfile
+from contextlib import contextmanager
+from typing import Callable
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+# =============================================================================
+# LOCKING
+# =============================================================================
+
+def lock_path_for(path: str) -> str:
+    """Sidecar lock file: 'notes/2025-12-11.md' -> 'notes/.2025-12-11.md.lock'."""
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, f".{name}.lock")
+
+
+@contextmanager
+def locked(path: str):
+    """
+    Holds an exclusive inter-process lock for `path` for the duration of the block.
+    The lock lives on a sidecar file because os.replace() swaps the note's inode.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    fd = os.open(lock_path_for(path), os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+# =============================================================================
+# ATOMIC WRITES
+# =============================================================================
+
+# mkstemp creates 0600 files and os.replace keeps that mode, so new files get
+# what open() would have given them instead. Read once: os.umask() can only
+# be queried by setting it.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def file_mode_for(path: str) -> int:
+    """Mode to give the replacement: the existing file's, else 0666 minus umask."""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+
+@contextmanager
+def atomic_writer(path: str, mode: str = 'w'):
+    """
+    Yields a file that replaces `path` in one step when the block exits
+    (temp file + fsync + rename); on error `path` is left untouched.
+    Use mode='wb' for binary content streamed in pieces.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        os.chmod(tmp_path, file_mode_for(path))
+        with os.fdopen(fd, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    # Persist the rename itself
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(directory, os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def atomic_write(path: str, content: str) -> None:
+    """
+    Replaces `path` with `content` in one step.
+    Callers that read-modify-write must hold `locked(path)`.
+    """
+    with atomic_writer(path) as f:
+        f.write(content)
+
+
+def update_file(path: str, transform: Callable[[str | None], str | None]) -> bool:
+    """
+    Locked read-modify-write. `transform` receives the current content
+    (None if the file doesn't exist) and returns the new content, or None
+    to leave the file alone. Returns True if the file was written.
+    """
+    with locked(path):
+        try:
+            with open(path, 'r') as f:
+                current = f.read()
+        except FileNotFoundError:
+            current = None
+
+        updated = transform(current)
+        if updated is None or updated == current:
+            return False
+
+        atomic_write(path, updated)
+        return True
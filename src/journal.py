@@ -0,0 +1,149 @@
+"""
+journal.py - Crash-Safe Session Journal for Billy
+
+Every chat session appends to its own JSONL file, fsynced after each turn.
+A crash, Ctrl-C or failed summary call loses at most the turn in flight,
+and `chat.py --resume` rebuilds the conversation from the journal.
+
+Record types (one JSON object per line):
+    {"type": "meta",    "ts": ..., "note_path": ...}
+    {"type": "turn",    "ts": ..., "user": ..., "model": ..., "opening": bool}
+    {"type": "running_summary", "ts": ..., "text": ..., "turns": N}
+    {"type": "summary", "ts": ..., "text": ...}
+    {"type": "end",     "ts": ...}
+
+A running_summary checkpoints the background summary of the first N turns,
+so a resumed session only summarizes the turns after it.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+
+from clock import get_timestamp
+
+
+# =============================================================================
+# WRITING
+# =============================================================================
+
+def truncate_torn_tail(path: str) -> None:
+    """
+    Cuts a partial last line left by a crash mid-write, so appends made
+    after resuming start on a clean line.
+    """
+    try:
+        with open(path, 'rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+    except FileNotFoundError:
+        pass
+
+
+class SessionJournal:
+    """
+    Append-only, fsync-per-record JSONL writer. Thread-safe: the background
+    summarizer appends from its own thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        truncate_torn_tail(path)
+        self.file = open(path, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
+
+    @classmethod
+    def create(cls, sessions_dir: str, note_path: str) -> "SessionJournal":
+        """Starts a new journal named after the session start time."""
+        name = datetime.now().strftime("%Y-%m-%d_%H%M%S") + ".jsonl"
+        journal = cls(os.path.join(sessions_dir, name))
+        journal.append({"type": "meta", "note_path": note_path})
+        return journal
+
+    def append(self, record: dict) -> None:
+        line = json.dumps({**record, "ts": get_timestamp()}, ensure_ascii=False) + "\n"
+        with self.lock:
+            if self.file.closed:
+                return  # A late background update after the session ended
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def log_turn(self, user_text: str, model_text: str, opening: bool = False) -> None:
+        """`opening` marks the context-only first prompt (it isn't user speech)."""
+        record = {"type": "turn", "user": user_text, "model": model_text}
+        if opening:
+            record["opening"] = True
+        self.append(record)
+
+    def log_running_summary(self, text: str, turns: int) -> None:
+        """Checkpoints the background summary, which covers the first `turns` turns."""
+        self.append({"type": "running_summary", "text": text, "turns": turns})
+
+    def log_summary(self, text: str) -> None:
+        self.append({"type": "summary", "text": text})
+
+    def close(self, finished: bool = True) -> None:
+        if finished:
+            self.append({"type": "end"})
+        with self.lock:
+            self.file.close()
+
+
+# =============================================================================
+# READING / RESUME
+# =============================================================================
+
+def load_journal(path: str) -> list[dict]:
+    """
+    Reads all complete records. A torn final line (crash mid-write) is dropped.
+    """
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return records
+
+
+def is_finished(records: list[dict]) -> bool:
+    return any(r.get("type") == "end" for r in records)
+
+
+def find_resumable_session(sessions_dir: str) -> str | None:
+    """Returns the most recent journal without an 'end' record, if any."""
+    if not os.path.isdir(sessions_dir):
+        return None
+    for name in sorted(os.listdir(sessions_dir), reverse=True):
+        if not name.endswith(".jsonl"):
+            continue
+        path = os.path.join(sessions_dir, name)
+        if not is_finished(load_journal(path)):
+            return path
+    return None
+
+
+def last_running_summary(records: list[dict]) -> tuple[str, int]:
+    """(text, turns covered) of the latest running summary, ("", 0) if none."""
+    for record in reversed(records):
+        if record.get("type") == "running_summary":
+            return record["text"], record["turns"]
+    return "", 0
+
+
+def rebuild_history(records: list[dict]) -> list[dict]:
+    """
+    Converts journal turns into chat history for model.start_chat(history=...),
+    so resuming costs nothing until the next message.
+    """
+    history = []
+    for record in records:
+        if record.get("type") == "turn":
+            history.append({"role": "user", "parts": [record["user"]]})
+            history.append({"role": "model", "parts": [record["model"]]})
+    return history
@@ -3,15 +3,19 @@ pipeline.py - Apple Health XML Parser for Billy
 
 Ingests export.xml and generates Daily Notes with Bio-Metrics.
 All time logic delegated to clock.py (single source of truth).
+
+Usage: python src/pipeline.py [--timeseries]
+--timeseries also exports high-resolution series to output/timeseries/
+(memory then grows with sample density; the daily aggregates never do).
 """
 
 import xml.etree.ElementTree as ET
 import os
 import sys
 import json
+import re
 from collections import defaultdict
 from datetime import date
-import statistics
 
 # =============================================================================
 # IMPORT FIX: Ensure clock.py is importable from project root
@@ -31,6 +35,24 @@ from clock import (
     get_human_time_of_day,
     is_valid_sleep_window,
 )
+from baseline import (
+    load_baselines,
+    save_baselines,
+    update_baseline,
+    get_zscore,
+    is_above_zscore,
+    format_zscore,
+    CLASSIFY_WINDOW,
+)
+from fileio import atomic_write, update_file
+from sketch import StreamingStats
+from timeseries import (
+    new_series_buffers,
+    add_sample,
+    add_sleep_stage,
+    sort_series_buffers,
+    export_timeseries,
+)
 
 
 # =============================================================================
@@ -41,6 +63,9 @@ XML_FILE = os.path.join(SCRIPT_DIR, '..', 'data', 'export.xml')
 OUTPUT_DIR = os.path.join(SCRIPT_DIR, '..', 'output', 'daily_notes')
 CONCEPTS_DIR = os.path.join(SCRIPT_DIR, '..', 'concepts')
 XP_CACHE_FILE = os.path.join(SCRIPT_DIR, '..', 'data', 'xp_cache.json')
+BASELINE_FILE = os.path.join(SCRIPT_DIR, '..', 'data', 'baselines.json')
+METRICS_FILE = os.path.join(SCRIPT_DIR, '..', 'data', 'daily_metrics.json')
+TIMESERIES_DIR = os.path.join(SCRIPT_DIR, '..', 'output', 'timeseries')
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
@@ -62,66 +87,148 @@ def count_markdown_files(*directories: str) -> int:
     return total
 
 
-def load_xp_cache() -> dict:
+def load_xp_cache(cache_file: str | None = None) -> dict:
     """
     Loads the XP cache from disk. Returns default if missing/corrupt.
     """
     try:
-        with open(XP_CACHE_FILE, 'r') as f:
+        with open(cache_file or XP_CACHE_FILE, 'r') as f:
             return json.load(f)
     except (FileNotFoundError, json.JSONDecodeError):
         return {"date": None, "count": 0}
 
 
-def save_xp_cache(count: int) -> None:
+def save_xp_cache(count: int, day_start: int, cache_file: str | None = None) -> None:
     """
-    Persists the current XP count with today's date.
+    Persists the current XP count with today's date and the count at day start.
     """
     cache = {
         "date": date.today().isoformat(),
-        "count": count
+        "count": count,
+        "day_start": day_start
     }
-    with open(XP_CACHE_FILE, 'w') as f:
-        json.dump(cache, f, indent=2)
+    # Atomic: server.py may read it mid-write
+    atomic_write(cache_file or XP_CACHE_FILE, json.dumps(cache, indent=2))
 
 
-def get_knowledge_xp() -> tuple[int, int]:
+def get_knowledge_xp(concepts_dir: str | None = None, output_dir: str | None = None, cache_file: str | None = None) -> tuple[int, int]:
     """
-    Returns (current_count, delta_since_last_cache).
-    Updates the cache file.
+    Returns (current_count, delta_today).
+    Updates the cache file. Repeated calls on the same day keep the same
+    reference point, so long-running callers (watch mode) don't zero the delta.
+    Directories default to the single-user module paths. The repo's concepts/
+    is only counted in that single-user case: a caller passing its own
+    `output_dir` (batch mode) gets no concepts unless it names `concepts_dir`.
     """
-    current_count = count_markdown_files(CONCEPTS_DIR, OUTPUT_DIR)
-    cache = load_xp_cache()
+    if concepts_dir is None and output_dir is None:
+        concepts_dir = CONCEPTS_DIR
+    directories = [d for d in (concepts_dir, output_dir or OUTPUT_DIR) if d]
+    current_count = count_markdown_files(*directories)
+    cache = load_xp_cache(cache_file)
     
-    # Calculate delta (default to 0 if no prior cache)
+    # First call of the day: yesterday's last count becomes today's reference
     cached_count = cache.get("count", 0)
-    delta = current_count - cached_count
+    if cache.get("date") == date.today().isoformat():
+        day_start = cache.get("day_start", cached_count)
+    else:
+        day_start = cached_count
+    delta = current_count - day_start
     
     # Persist new state
-    save_xp_cache(current_count)
+    save_xp_cache(current_count, day_start, cache_file)
     
     return current_count, delta
 
 
+# =============================================================================
+# DAILY METRICS CACHE
+# =============================================================================
+
+def save_daily_metrics(metrics_file: str, daily_metrics: dict) -> None:
+    """
+    Persists per-day aggregates ({date: {sleep_hours, hrv, hrv_samples, hrv_p10,
+    hrv_median, hrv_p90, heart_rate, zscores}})
+    so other processes (server.py) can read them without re-parsing the export.
+    Written atomically, so a concurrent reader never sees a truncated file.
+    """
+    atomic_write(metrics_file, json.dumps(daily_metrics, indent=2))
+
+
+def load_daily_metrics(metrics_file: str | None = None) -> dict:
+    """
+    Loads per-day aggregates. Returns empty dict if missing/corrupt.
+    """
+    try:
+        with open(metrics_file or METRICS_FILE, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def day_zscores(baselines: dict, date_key: str, values: dict, previous: dict) -> dict:
+    """
+    Z-scores of one day's values against the baseline of the days before it -
+    the same numbers its daily note shows. Days the baseline already absorbed
+    keep the z-score recorded when they were first classified (`previous`).
+    """
+    zscores = {}
+    for metric, value in values.items():
+        last_date = baselines.get(metric, {}).get("last_date")
+        if value <= 0:
+            z = None
+        elif last_date is None or date_key > last_date:
+            z = get_zscore(baselines, metric, value)
+            z = round(z, 2) if z is not None else None
+        else:
+            z = (previous.get(date_key, {}).get("zscores") or {}).get(metric)
+        zscores[metric] = z
+    return zscores
+
+
 # =============================================================================
 # DAILY NOTE GENERATION
 # =============================================================================
 
-def generate_daily_note(date_key: str, sleep_hours: float, hrv_avg: float, knowledge_xp: tuple[int, int] | None = None):
+def describe_against_baseline(label: str, z: float | None) -> str:
+    """
+    Appends the personal z-score to a status label when a baseline exists.
+    Output: "🟢 Fully Charged, z=+0.4 vs 28d" or "🟢 Fully Charged"
+    """
+    z_str = format_zscore(z)
+    return f"{label}, {z_str} vs {CLASSIFY_WINDOW}d" if z_str else label
+
+
+def generate_daily_note(date_key: str, sleep_hours: float, hrv_avg: float, knowledge_xp: tuple[int, int] | None = None, zscores: dict | None = None, output_dir: str | None = None, hrv_spread: tuple[float, float, float] | None = None) -> bool:
     """
     Generates the Markdown file with Sleep + HRV data.
     Injects ground-truth timestamp from clock module.
-    Optionally includes Knowledge XP counter.
+    Optionally includes Knowledge XP counter and HRV spread (p10, median, p90).
+    Status is classified from the day's z-scores (see day_zscores - the same
+    numbers daily_metrics.json records), falling back to generic thresholds
+    where no z-score exists yet.
+    Returns True if a new note was written.
     """
-    filename = os.path.join(OUTPUT_DIR, f"{date_key}.md")
+    filename = os.path.join(output_dir or OUTPUT_DIR, f"{date_key}.md")
+    zscores = zscores or {}
     
-    # Status Logic
-    battery_status = "🟢 Fully Charged" if sleep_hours > 7.0 else "🔴 Low Battery"
+    # Status Logic (personal baseline, generic fallback: 7.0h)
+    sleep_z = zscores.get("sleep_hours")
+    battery_status = "🟢 Fully Charged" if is_above_zscore("sleep_hours", sleep_hours, sleep_z) else "🔴 Low Battery"
+    if sleep_hours > 0:
+        battery_status = describe_against_baseline(battery_status, sleep_z)
     
-    # HRV Interpretation (Generic baseline - 40-60ms is average, varies by person)
+    # HRV Interpretation (personal baseline, generic fallback: 50ms)
     hrv_status = "Unknown"
     if hrv_avg > 0:
-        hrv_status = "⚡ High Resilience" if hrv_avg > 50 else "⚠️ Stressed/Recovering"
+        hrv_z = zscores.get("hrv")
+        hrv_status = "⚡ High Resilience" if is_above_zscore("hrv", hrv_avg, hrv_z) else "⚠️ Stressed/Recovering"
+        hrv_status = describe_against_baseline(hrv_status, hrv_z)
+
+    # HRV spread line (if provided)
+    spread_line = ""
+    if hrv_spread:
+        p10, median, p90 = hrv_spread
+        spread_line = f"\n- **HRV Spread:** median {median:.1f} ms (p10 {p10:.1f} / p90 {p90:.1f})"
 
     # Knowledge XP line (if provided)
     xp_line = ""
@@ -141,7 +248,7 @@ def generate_daily_note(date_key: str, sleep_hours: float, hrv_avg: float, knowl
 
 ## 1. Hardware State (Bio-Metrics)
 - **Sleep Duration:** {sleep_hours:.2f} hours ({battery_status})
-- **Nocturnal HRV:** {hrv_avg:.1f} ms ({hrv_status}){xp_line}
+- **Nocturnal HRV:** {hrv_avg:.1f} ms ({hrv_status}){spread_line}{xp_line}
 
 ## 2. Context (The Software)
 - **Log Time:** {display_time} ({time_context})
@@ -151,37 +258,117 @@ def generate_daily_note(date_key: str, sleep_hours: float, hrv_avg: float, knowl
 - [ ] 
 """
     
-    if not os.path.exists(filename):
-        with open(filename, "w") as f:
-            f.write(content)
+    # Create-only, under the note lock (chat sessions may be writing too)
+    if update_file(filename, lambda current: content if current is None else None):
         print(f"✅ Generated Note: {filename}")
-    else:
-        print(f"⚠️  Skipped (Note exists): {filename}")
+        return True
+    print(f"⚠️  Skipped (Note exists): {filename}")
+    return False
+
+
+def update_knowledge_line(date_key: str, knowledge_xp: tuple[int, int], output_dir: str | None = None) -> bool:
+    """
+    Rewrites the Knowledge Base line of an existing note in place.
+    Returns True if the note changed (no-op writes are skipped so file
+    watchers don't see their own echo).
+    """
+    filename = os.path.join(output_dir or OUTPUT_DIR, f"{date_key}.md")
+    if not os.path.exists(filename):
+        return False
+
+    count, delta = knowledge_xp
+    delta_str = f"+{delta}" if delta >= 0 else str(delta)
+
+    def patch(content: str | None) -> str | None:
+        if content is None:
+            return None
+        return re.sub(
+            r'^- \*\*Knowledge Base:\*\*.*$',
+            f"- **Knowledge Base:** {count} Nodes ({delta_str} today) 📈",
+            content,
+            count=1,
+            flags=re.MULTILINE,
+        )
+
+    # Locked read-modify-write; unchanged content is not rewritten
+    return update_file(filename, patch)
 
 
 # =============================================================================
 # XML PARSING
 # =============================================================================
 
-def parse_health_data(xml_file: str):
+def frozen_through(baselines: dict, known_days: dict) -> str | None:
+    """
+    Last date whose aggregates can be reused instead of re-parsed: every metric
+    with a baseline has absorbed it (absorbed days are final), and the caller
+    still holds its aggregates. None if nothing can be reused.
+    """
+    last_dates = [state["last_date"] for state in baselines.values()]
+    if not known_days or not last_dates or None in last_dates:
+        return None
+    return min(min(last_dates), max(known_days))
+
+
+def parse_health_data(xml_file: str, output_dir: str | None = None, cache_dir: str | None = None, concepts_dir: str | None = None, timeseries_dir: str | None = None, warm: dict | None = None) -> dict:
     """
     Streams through Apple Health XML and extracts:
     - Sleep duration (Core + Deep + REM stages)
     - Nocturnal HRV (00:00 - 08:00 window)
+    - Optionally (timeseries_dir set): hypnogram, HRV and heart-rate series,
+      for the whole export and per day for the days that get a note
+
+    Paths default to the single-user layout (data/, output/daily_notes, concepts/).
+    When `output_dir` is given, concepts/ is not assumed: pass `concepts_dir`.
+    `cache_dir` holds xp_cache.json, baselines.json and daily_metrics.json.
+
+    `warm` is a dict owned by a long-lived caller (watch mode). Its "days"
+    holds the previous run's per-day aggregates; records of days the baseline
+    already absorbed are skipped by their date prefix and those aggregates
+    reused, so only the days a new export adds are parsed. Series need every
+    sample, so nothing is skipped when `timeseries_dir` is set.
+    Returns run stats: {"days", "notes_written", "skipped_records", "reused_days"}.
     """
+    if concepts_dir is None and output_dir is None:
+        concepts_dir = CONCEPTS_DIR
+    output_dir = output_dir or OUTPUT_DIR
+    xp_cache_file = os.path.join(cache_dir, os.path.basename(XP_CACHE_FILE)) if cache_dir else XP_CACHE_FILE
+    baseline_file = os.path.join(cache_dir, os.path.basename(BASELINE_FILE)) if cache_dir else BASELINE_FILE
+    metrics_file = os.path.join(cache_dir, os.path.basename(METRICS_FILE)) if cache_dir else METRICS_FILE
+    os.makedirs(output_dir, exist_ok=True)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+
     print(f"Analyzing {xml_file}...")
     print(f"Run timestamp: {get_timestamp()}")
     
+    baselines = load_baselines(baseline_file)
+    known_days = warm.get("days", {}) if warm is not None and not timeseries_dir else {}
+    frozen = frozen_through(baselines, known_days)
+    reused_days = {d: m for d, m in known_days.items() if frozen and d <= frozen}
+    if reused_days:
+        print(f"♻️  Reusing {len(reused_days)} absorbed days (through {frozen})")
+    
     context = ET.iterparse(xml_file, events=("start", "end"))
     
     daily_sleep = defaultdict(int)      # Minutes per day (integer)
-    daily_hrv = defaultdict(list)       # HRV readings per day
+    daily_hrv = defaultdict(StreamingStats)     # Nocturnal HRV per day (fixed memory)
+    daily_hr = defaultdict(StreamingStats)      # Heart rate per day (fixed memory)
     skipped_records = 0                 # Data integrity counter
+    series = new_series_buffers() if timeseries_dir else None
 
     for event, elem in context:
         if event == "end" and elem.tag == "Record":
             record_type = elem.attrib.get('type')
             
+            # Absorbed days are final - skip before any timestamp parsing.
+            # The timestamp's date prefix is its local date key (sleep: end).
+            if frozen:
+                stamp_field = 'endDate' if record_type == "HKCategoryTypeIdentifierSleepAnalysis" else 'startDate'
+                if elem.attrib.get(stamp_field, '')[:10] <= frozen:
+                    elem.clear()
+                    continue
+            
             # --- SLEEP LOGIC ---
             if record_type == "HKCategoryTypeIdentifierSleepAnalysis":
                 value = elem.attrib.get('value')
@@ -199,21 +386,46 @@ def parse_health_data(xml_file: str):
                             duration_min = calculate_duration_minutes(start, end)
                             date_key = get_date_key(end)
                             daily_sleep[date_key] += duration_min
+                            if series is not None:
+                                add_sleep_stage(series, start, end, value)
                         else:
                             skipped_records += 1
                     except ValueError:
                         skipped_records += 1
+                
+                # Awake segments don't count as sleep but belong in the hypnogram
+                elif series is not None and value == "HKCategoryValueSleepAnalysisAwake":
+                    try:
+                        start = parse_apple_health_timestamp(elem.attrib['startDate'])
+                        end = parse_apple_health_timestamp(elem.attrib['endDate'])
+                        if is_valid_sleep_window(start, end):
+                            add_sleep_stage(series, start, end, value)
+                    except ValueError:
+                        skipped_records += 1
 
             # --- HRV LOGIC ---
             if record_type == "HKQuantityTypeIdentifierHeartRateVariabilitySDNN":
                 try:
                     val = float(elem.attrib.get('value'))
                     date_obj = parse_apple_health_timestamp(elem.attrib['startDate'])
+                    if series is not None:
+                        add_sample(series, "hrv", date_obj, val)
                     
                     # FILTER: Only count HRV between 00:00 and 08:00 AM (nocturnal)
                     if 0 <= date_obj.hour < 8:
                         date_key = get_date_key(date_obj)
-                        daily_hrv[date_key].append(val)
+                        daily_hrv[date_key].add(val)
+                except (ValueError, TypeError):
+                    skipped_records += 1
+
+            # --- HEART RATE LOGIC ---
+            if record_type == "HKQuantityTypeIdentifierHeartRate":
+                try:
+                    val = float(elem.attrib.get('value'))
+                    date_obj = parse_apple_health_timestamp(elem.attrib['startDate'])
+                    daily_hr[get_date_key(date_obj)].add(val)
+                    if series is not None:
+                        add_sample(series, "heart_rate", date_obj, val)
                 except (ValueError, TypeError):
                     skipped_records += 1
 
@@ -226,22 +438,89 @@ def parse_health_data(xml_file: str):
     print("\n--- Generating Bio-Dashboard ---")
     
     # Get Knowledge XP once (avoid re-counting per note)
-    knowledge_xp = get_knowledge_xp()
-    print(f"📚 Knowledge Base: {knowledge_xp[0]} nodes ({'+' if knowledge_xp[1] >= 0 else ''}{knowledge_xp[1]} since last run)")
+    knowledge_xp = get_knowledge_xp(concepts_dir, output_dir, xp_cache_file)
+    print(f"📚 Knowledge Base: {knowledge_xp[0]} nodes ({'+' if knowledge_xp[1] >= 0 else ''}{knowledge_xp[1]} today)")
+    
+    # Get all unique dates from both sets (plus reused days)
+    all_dates = sorted(set(list(daily_sleep.keys()) + list(daily_hrv.keys())) | set(reused_days))
+    recent_dates = set(all_dates[-7:])
     
-    # Get all unique dates from both sets
-    all_dates = sorted(set(list(daily_sleep.keys()) + list(daily_hrv.keys())))[-7:]
+    # Single linear pass: classify each recent day against the baseline of the
+    # days before it, then absorb it (O(1) per day, already-seen days are no-ops).
+    # The newest day is held back: an export taken mid-night holds a partial
+    # value, and absorbed days can't be revised. The next export absorbs it.
+    previous_metrics = load_daily_metrics(metrics_file)
+    daily_metrics = {}
+    notes_written = 0
     
     for date_key in all_dates:
+        if date_key in reused_days:
+            # Already absorbed and classified - only a missing note needs work
+            day = daily_metrics[date_key] = reused_days[date_key]
+            if date_key in recent_dates:
+                spread = (day["hrv_p10"], day["hrv_median"], day["hrv_p90"]) if day["hrv_samples"] else None
+                notes_written += generate_daily_note(date_key, day["sleep_hours"], day["hrv"], knowledge_xp, day.get("zscores"), output_dir, spread)
+            continue
+        
         # Calculate Sleep Hours from integer minutes
         sleep_minutes = daily_sleep.get(date_key, 0)
         hours = sleep_minutes / 60
         
         # Calculate HRV Average
-        hrv_readings = daily_hrv.get(date_key, [])
-        avg_hrv = statistics.mean(hrv_readings) if hrv_readings else 0.0
+        hrv_stats = daily_hrv.get(date_key, StreamingStats())
+        avg_hrv = hrv_stats.mean if hrv_stats.count else 0.0
+        hrv_spread = None
+        if hrv_stats.count:
+            hrv_spread = (hrv_stats.quantile(0.1), hrv_stats.quantile(0.5), hrv_stats.quantile(0.9))
         
-        generate_daily_note(date_key, hours, avg_hrv, knowledge_xp)
+        # Computed once: the note and daily_metrics.json must show the same numbers
+        zscores = day_zscores(baselines, date_key, {"sleep_hours": hours, "hrv": avg_hrv}, previous_metrics)
+        
+        daily_metrics[date_key] = {
+            "sleep_hours": round(hours, 2),
+            "hrv": round(avg_hrv, 1),
+            "hrv_samples": hrv_stats.count,
+            "hrv_p10": round(hrv_spread[0], 1) if hrv_spread else None,
+            "hrv_median": round(hrv_spread[1], 1) if hrv_spread else None,
+            "hrv_p90": round(hrv_spread[2], 1) if hrv_spread else None,
+            "heart_rate": daily_hr[date_key].summary() if date_key in daily_hr else None,
+            "zscores": zscores,
+        }
+        
+        if date_key in recent_dates:
+            notes_written += generate_daily_note(date_key, hours, avg_hrv, knowledge_xp, zscores, output_dir, hrv_spread)
+        
+        if date_key == all_dates[-1]:
+            continue
+        # Missing data is not a zero reading - keep it out of the baseline
+        if hours > 0:
+            update_baseline(baselines, "sleep_hours", date_key, hours)
+        if avg_hrv > 0:
+            update_baseline(baselines, "hrv", date_key, avg_hrv)
+    
+    save_baselines(baseline_file, baselines)
+    save_daily_metrics(metrics_file, daily_metrics)
+    if warm is not None:
+        warm["days"] = daily_metrics
+    
+    # --- TIME SERIES ---
+    series_counts = {}
+    if series is not None:
+        sort_series_buffers(series)
+        series_counts = export_timeseries(series, timeseries_dir)
+        for metric, (full, preview) in series_counts.items():
+            print(f"📈 Series {metric}: {full} points ({preview} in preview)")
+        # One directory per day that has a note, cut by the note's date key
+        for date_key in sorted(recent_dates):
+            export_timeseries(series, os.path.join(timeseries_dir, date_key), date_key, date_key)
+    
+    return {
+        "days": len(all_dates),
+        "notes_written": notes_written,
+        "skipped_records": skipped_records,
+        "reused_days": len(reused_days),
+        "series": series_counts,
+    }
 
 
 # =============================================================================
@@ -249,4 +528,4 @@ def parse_health_data(xml_file: str):
 # =============================================================================
 
 if __name__ == "__main__":
-    parse_health_data(XML_FILE)
+    parse_health_data(XML_FILE, timeseries_dir=TIMESERIES_DIR if "--timeseries" in sys.argv else None)
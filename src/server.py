@@ -0,0 +1,326 @@
+"""
+server.py - Local Read-Only Bio-Metrics API for Billy
+
+Serves what the Python pipeline computes to the Tauri/React frontend as JSON.
+Nothing is parsed per request: responses are rendered once, cached in memory
+(raw + gzip + ETag), and the whole cache is dropped when the watcher sees
+data/ or the notes change. Polling clients with a matching If-None-Match get
+a bodiless 304.
+
+Endpoints (GET):
+    /api/days                               All days with metrics
+    /api/days/<YYYY-MM-DD>                  One day: metrics + z-scores (as in its note) + note sections
+    /api/series?metric=hrv&from=...&to=...  Time series (sleep_hours | hrv | hrv_samples | hrv_p10 | hrv_median | hrv_p90)
+    /api/notes/<YYYY-MM-DD>/sections        Note sections keyed by heading
+    /api/knowledge                          Knowledge XP stats
+
+Usage: python src/server.py [--port 8765]
+Binds to 127.0.0.1 only.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# =============================================================================
+# IMPORT FIX: Ensure pipeline.py is importable
+# =============================================================================
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+import pipeline
+from baseline import load_baselines, get_baseline_stats, CLASSIFY_WINDOW
+from watch import create_watcher, DATA_DIR
+
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+GZIP_MIN_BYTES = 512          # Smaller bodies aren't worth compressing
+MAX_CACHE_ENTRIES = 1024      # Arbitrary query strings can't grow the cache unbounded
+SERIES_METRICS = ("sleep_hours", "hrv", "hrv_samples", "hrv_p10", "hrv_median", "hrv_p90")
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+class ApiError(Exception):
+    """Maps to an HTTP error response."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# =============================================================================
+# NOTE PARSING
+# =============================================================================
+
+def parse_note_sections(content: str) -> dict:
+    """
+    Splits a Daily Note into {heading: body} on '## ' headings.
+    Frontmatter and the title line are dropped.
+    """
+    sections = {}
+    heading = None
+    body: list[str] = []
+
+    for line in content.splitlines():
+        if line.startswith("## "):
+            if heading is not None:
+                sections[heading] = "\n".join(body).strip()
+            heading = line[3:].strip()
+            body = []
+        elif heading is not None:
+            body.append(line)
+
+    if heading is not None:
+        sections[heading] = "\n".join(body).strip()
+    return sections
+
+
+def read_note_sections(date_key: str) -> dict | None:
+    """Returns the note's sections, or None if the note doesn't exist."""
+    path = os.path.join(pipeline.OUTPUT_DIR, f"{date_key}.md")
+    try:
+        with open(path, 'r') as f:
+            return parse_note_sections(f.read())
+    except FileNotFoundError:
+        return None
+
+
+# =============================================================================
+# RESPONSE BUILDERS (called only on cache miss)
+# =============================================================================
+
+def build_days(query: dict) -> dict:
+    """All days with their aggregates, oldest first."""
+    metrics = pipeline.load_daily_metrics()
+    return {"days": [{"date": d, **metrics[d]} for d in sorted(metrics)]}
+
+
+def build_day(date_key: str) -> dict:
+    """
+    One day's aggregates and note sections. Z-scores are the ones the pipeline
+    computed against the days before `date_key`, so they match the note.
+    """
+    metrics = pipeline.load_daily_metrics()
+    sections = read_note_sections(date_key)
+    if date_key not in metrics and sections is None:
+        raise ApiError(404, f"No data for {date_key}")
+
+    day = dict(metrics.get(date_key, {}))
+    zscores = day.pop("zscores", None) or {"sleep_hours": None, "hrv": None}
+
+    return {
+        "date": date_key,
+        "metrics": day or None,
+        "zscores": zscores,
+        "baseline_window": CLASSIFY_WINDOW,
+        "sections": sections,
+    }
+
+
+def build_series(query: dict) -> dict:
+    """
+    Parallel date/value arrays for one metric, optionally bounded by from/to,
+    plus the metric's current baseline (as of the latest absorbed day).
+    """
+    metric = query.get("metric", ["hrv"])[0]
+    if metric not in SERIES_METRICS:
+        raise ApiError(400, f"Unknown metric '{metric}' (expected one of {', '.join(SERIES_METRICS)})")
+
+    start = query.get("from", [""])[0]
+    end = query.get("to", ["9999-99-99"])[0]
+    metrics = pipeline.load_daily_metrics()
+
+    # ISO date keys sort lexicographically
+    dates = [d for d in sorted(metrics) if start <= d <= end]
+    return {
+        "metric": metric,
+        "dates": dates,
+        "values": [metrics[d].get(metric) for d in dates],
+        "baseline": get_baseline_stats(load_baselines(pipeline.BASELINE_FILE), metric) if metric in ("sleep_hours", "hrv") else None,
+    }
+
+
+def build_sections(date_key: str) -> dict:
+    """Note sections for one day."""
+    sections = read_note_sections(date_key)
+    if sections is None:
+        raise ApiError(404, f"No note for {date_key}")
+    return {"date": date_key, "sections": sections}
+
+
+def build_knowledge(query: dict) -> dict:
+    """Knowledge XP as last recorded by the pipeline (no recount)."""
+    cache = pipeline.load_xp_cache()
+    count = cache.get("count", 0)
+    return {
+        "count": count,
+        "delta_today": count - cache.get("day_start", count),
+        "as_of": cache.get("date"),
+    }
+
+
+def route(path: str, query: dict) -> dict:
+    """Dispatches a request path to its builder."""
+    parts = [p for p in path.split("/") if p]
+    if parts[:1] != ["api"]:
+        raise ApiError(404, "Not found")
+    parts = parts[1:]
+
+    if parts == ["days"]:
+        return build_days(query)
+    if parts == ["series"]:
+        return build_series(query)
+    if parts == ["knowledge"]:
+        return build_knowledge(query)
+    if len(parts) == 2 and parts[0] == "days" and DATE_PATTERN.match(parts[1]):
+        return build_day(parts[1])
+    if len(parts) == 3 and parts[0] == "notes" and parts[2] == "sections" and DATE_PATTERN.match(parts[1]):
+        return build_sections(parts[1])
+    raise ApiError(404, "Not found")
+
+
+# =============================================================================
+# RESPONSE CACHE
+# =============================================================================
+
+class ResponseCache:
+    """
+    Rendered responses keyed by request target. Each entry stores
+    (status, body, gzipped_body, etag). Cleared wholesale on file changes.
+    """
+
+    def __init__(self):
+        self.entries: dict[str, tuple[int, bytes, bytes | None, str]] = {}
+        self.lock = threading.Lock()
+        self.generation = 0
+
+    def get(self, target: str) -> tuple[int, bytes, bytes | None, str]:
+        entry = self.entries.get(target)
+        if entry is not None:
+            return entry
+
+        generation = self.generation
+        entry = self._render(target)
+        with self.lock:
+            # Don't store a response rendered from data that changed mid-render
+            if generation == self.generation:
+                if len(self.entries) >= MAX_CACHE_ENTRIES:
+                    self.entries = {}
+                self.entries[target] = entry
+        return entry
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.generation += 1
+            self.entries = {}
+
+    @staticmethod
+    def _render(target: str) -> tuple[int, bytes, bytes | None, str]:
+        url = urlsplit(target)
+        try:
+            status, payload = 200, route(url.path, parse_qs(url.query))
+        except ApiError as e:
+            status, payload = e.status, {"error": e.message}
+
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        gzipped = gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_BYTES else None
+        etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        return status, body, gzipped, etag
+
+
+CACHE = ResponseCache()
+
+
+# =============================================================================
+# HTTP HANDLER
+# =============================================================================
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """Read-only JSON handler backed by the response cache."""
+
+    server_version = "BillyAPI/1.0"
+
+    def do_GET(self):
+        status, body, gzipped, etag = CACHE.get(self.path)
+
+        if status == 200 and etag in self.headers.get("If-None-Match", ""):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self._send_common_headers()
+            self.end_headers()
+            return
+
+        use_gzip = gzipped is not None and "gzip" in self.headers.get("Accept-Encoding", "")
+        payload = gzipped if use_gzip else body
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("ETag", etag)
+        self.send_header("Vary", "Accept-Encoding")
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self._send_common_headers()
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_common_headers(self):
+        self.send_header("Cache-Control", "no-cache")
+        # Tauri/Vite dev origin differs from ours
+        self.send_header("Access-Control-Allow-Origin", "*")
+
+    def log_message(self, format, *args):
+        pass  # Polling dashboards would flood the terminal
+
+
+# =============================================================================
+# INVALIDATION
+# =============================================================================
+
+def start_invalidation_thread() -> None:
+    """
+    Drops the response cache whenever data/, concepts/ or the notes change.
+    """
+    directories = [d for d in (DATA_DIR, pipeline.CONCEPTS_DIR, pipeline.OUTPUT_DIR) if os.path.isdir(d)]
+    watcher = create_watcher(directories)
+
+    def loop():
+        while True:
+            if watcher.wait(None):
+                CACHE.invalidate()
+
+    threading.Thread(target=loop, name="billy-invalidate", daemon=True).start()
+
+
+# =============================================================================
+# ENTRY POINT
+# =============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Billy's bio-metrics as a local JSON API.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    start_invalidation_thread()
+    httpd = ThreadingHTTPServer((HOST, args.port), ApiHandler)
+    print(f"🌐 Billy API listening on http://{HOST}:{args.port}/api/days")
+
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[server] Stopped.")
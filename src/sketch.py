@@ -0,0 +1,160 @@
+"""
+sketch.py - Fixed-Memory Streaming Statistics for Billy
+
+Keeping every raw reading just to take a mean (or a median) makes pipeline
+memory grow with sample density - fine for a few HRV readings a night,
+not for heart rate every few seconds.
+
+StreamingStats holds, in bounded memory per day and metric:
+- Welford count / mean / variance
+- min / max
+- a KLL quantile sketch (median, p10, p90, ...)
+
+Everything is mergeable, so partial results from chunks or worker
+processes combine into the same answer shape.
+"""
+
+import math
+
+
+# =============================================================================
+# KLL QUANTILE SKETCH
+# =============================================================================
+
+class KLLSketch:
+    """
+    KLL sketch (Karnin, Lang, Liberty 2016). Levels of "compactors"; when a
+    level fills up it is sorted and every other item is promoted to the next
+    level with double weight. Memory is O(k) regardless of stream length;
+    rank error is roughly 1.7/k. Exact until the first compaction (< ~k items).
+    """
+
+    def __init__(self, k: int = 200):
+        self.k = k
+        self.compactors: list[list[float]] = [[]]
+        self.size = 0
+        self.max_size = self._capacity(0)
+        self._flip = False          # Deterministic alternation of kept half
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return int(math.ceil(self.k * (2 / 3) ** depth)) + 1
+
+    def _grow(self) -> None:
+        self.compactors.append([])
+        self.max_size = sum(self._capacity(h) for h in range(len(self.compactors)))
+
+    def _compress(self) -> None:
+        for level, items in enumerate(self.compactors):
+            if len(items) >= self._capacity(level):
+                if level + 1 >= len(self.compactors):
+                    self._grow()
+                items.sort()
+                # Odd leftover stays at this level so no weight is lost
+                leftover = [items.pop()] if len(items) % 2 else []
+                self._flip = not self._flip
+                self.compactors[level + 1].extend(items[int(self._flip)::2])
+                self.compactors[level] = leftover
+                self.size = sum(len(c) for c in self.compactors)
+                break
+
+    def add(self, value: float) -> None:
+        self.compactors[0].append(value)
+        self.size += 1
+        if self.size >= self.max_size:
+            self._compress()
+
+    def merge(self, other: "KLLSketch") -> None:
+        while len(self.compactors) < len(other.compactors):
+            self._grow()
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        self.size = sum(len(c) for c in self.compactors)
+        while self.size >= self.max_size:
+            self._compress()
+
+    def quantile(self, q: float) -> float | None:
+        """Returns the approximate q-quantile (0 <= q <= 1), None if empty."""
+        weighted = sorted(
+            (value, 1 << level)
+            for level, items in enumerate(self.compactors)
+            for value in items
+        )
+        if not weighted:
+            return None
+
+        total = sum(weight for _, weight in weighted)
+        target = q * total
+        cumulative = 0
+        for value, weight in weighted:
+            cumulative += weight
+            if cumulative >= target:
+                return value
+        return weighted[-1][0]
+
+
+# =============================================================================
+# STREAMING STATS
+# =============================================================================
+
+class StreamingStats:
+    """
+    Fixed-memory accumulator: count, mean, variance, min, max, quantiles.
+    """
+
+    def __init__(self, k: int = 200):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0              # Sum of squared deviations (Welford)
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = KLLSketch(k)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.sketch.add(value)
+
+    def merge(self, other: "StreamingStats") -> None:
+        """Combines another accumulator into this one (Chan et al. parallel update)."""
+        if other.count == 0:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / total
+        self.mean += delta * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+
+    @property
+    def variance(self) -> float:
+        """Population variance (0.0 for fewer than two samples)."""
+        return self._m2 / self.count if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def quantile(self, q: float) -> float | None:
+        return self.sketch.quantile(q)
+
+    def summary(self) -> dict:
+        """JSON-ready summary (empty dict if no samples)."""
+        if self.count == 0:
+            return {}
+        return {
+            "count": self.count,
+            "mean": round(self.mean, 2),
+            "std": round(self.std, 2),
+            "min": round(self.min, 2),
+            "max": round(self.max, 2),
+            "p10": round(self.quantile(0.1), 2),
+            "median": round(self.quantile(0.5), 2),
+            "p90": round(self.quantile(0.9), 2),
+        }
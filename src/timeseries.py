@@ -0,0 +1,279 @@
+"""
+timeseries.py - High-Resolution Series Export for Billy
+
+The daily notes collapse each night into one number. Charts need the raw shape:
+per-minute sleep-stage hypnograms and every HRV / heart-rate sample.
+
+Samples are buffered in typed arrays (array module, 12 bytes/point instead of
+~100 for tuples), bucketed by the local day they belong to (the same key the
+daily notes use). Exports arrive out of order across sources, but each day
+is sorted on its own, so no global sort ever materializes per-sample keys,
+and a day range is just a run of buckets.
+Each metric is written as one compact binary file plus a downsampled preview
+the frontend can draw a year from in a single read.
+
+File layout (little-endian, loadable with one fetch + typed-array views):
+    0..3        magic b"BLTS"
+    4..7        uint32 header length H
+    8..8+H      JSON header (UTF-8, space-padded so data starts 8-byte aligned)
+    ...         float64 timestamps[count]  (epoch milliseconds)
+    ...         float32 values[count]
+"""
+
+import json
+import os
+import struct
+import sys
+from array import array
+from datetime import date, datetime, timezone
+
+from fileio import atomic_writer
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+MAGIC = b"BLTS"
+FORMAT_VERSION = 1
+PREVIEW_POINTS = 2000        # Enough for a year-wide chart at screen resolution
+MINUTE_MS = 60_000
+
+# Hypnogram levels (top of chart = awake)
+SLEEP_STAGE_LEVELS = {
+    "HKCategoryValueSleepAnalysisAwake": 3,
+    "HKCategoryValueSleepAnalysisAsleepREM": 2,
+    "HKCategoryValueSleepAnalysisAsleepCore": 1,
+    "HKCategoryValueSleepAnalysisAsleepDeep": 0,
+}
+
+# metric -> (unit, downsampling method)
+SERIES_SPECS = {
+    "sleep_stage": ("level", "minmax"),   # Step data: keep brief awakenings visible
+    "hrv": ("ms", "lttb"),
+    "heart_rate": ("bpm", "lttb"),
+}
+
+
+# =============================================================================
+# BUFFERS
+# =============================================================================
+
+def new_series_buffers() -> dict:
+    """Returns {metric: {day_ordinal: (timestamps_ms, values)}} typed-array buffers."""
+    return {metric: {} for metric in SERIES_SPECS}
+
+
+def day_bucket(buffers: dict, metric: str, day: int) -> tuple[array, array]:
+    """The (timestamps, values) arrays of one metric for one local day."""
+    bucket = buffers[metric].get(day)
+    if bucket is None:
+        bucket = buffers[metric][day] = (array('d'), array('f'))
+    return bucket
+
+
+def add_sample(buffers: dict, metric: str, dt: datetime, value: float) -> None:
+    """Appends one point-in-time sample, keyed to its local date."""
+    timestamps, values = day_bucket(buffers, metric, dt.toordinal())
+    timestamps.append(dt.timestamp() * 1000)
+    values.append(value)
+
+
+def add_sleep_stage(buffers: dict, start: datetime, end: datetime, stage: str) -> None:
+    """
+    Expands a sleep-stage interval into per-minute hypnogram samples.
+    The whole interval belongs to the night it ends on, like the sleep totals.
+    """
+    level = SLEEP_STAGE_LEVELS.get(stage)
+    if level is None:
+        return
+    timestamps, values = day_bucket(buffers, "sleep_stage", end.toordinal())
+    start_ms = int(start.timestamp()) // 60 * MINUTE_MS
+    end_ms = int(end.timestamp() * 1000)
+    for ts in range(start_ms, end_ms, MINUTE_MS):
+        timestamps.append(ts)
+        values.append(level)
+
+
+def sort_series_buffers(buffers: dict) -> None:
+    """
+    Sorts every day bucket by timestamp, in place. Call once after parsing;
+    exports assume sorted buffers. Only one day's index list exists at a time.
+    """
+    for days in buffers.values():
+        for day, (timestamps, values) in days.items():
+            if all(timestamps[i] <= timestamps[i + 1] for i in range(len(timestamps) - 1)):
+                continue
+            order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+            days[day] = (array('d', (timestamps[i] for i in order)), array('f', (values[i] for i in order)))
+
+
+def slice_by_dates(days: dict, start_date: str | None, end_date: str | None) -> tuple[array, array]:
+    """
+    Concatenates the sorted day buckets in [start_date, end_date] (inclusive,
+    "YYYY-MM-DD", local date keys as used by the daily notes).
+    """
+    lo = date.fromisoformat(start_date).toordinal() if start_date else None
+    hi = date.fromisoformat(end_date).toordinal() if end_date else None
+    timestamps, values = array('d'), array('f')
+    for day in sorted(days):
+        if (lo is None or day >= lo) and (hi is None or day <= hi):
+            timestamps.extend(days[day][0])
+            values.extend(days[day][1])
+    return timestamps, values
+
+
+# =============================================================================
+# DOWNSAMPLING
+# =============================================================================
+
+def lttb(timestamps: array, values: array, threshold: int) -> list[int]:
+    """
+    Largest-Triangle-Three-Buckets: picks `threshold` indices that preserve
+    the visual shape of the line (peaks, troughs, slopes).
+    """
+    n = len(timestamps)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    indices = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        # Average of the next bucket (the third triangle vertex)
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        span = next_end - next_start
+        avg_x = sum(timestamps[next_start:next_end]) / span
+        avg_y = sum(values[next_start:next_end]) / span
+
+        # Point in this bucket forming the largest triangle with a and the average
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        ax, ay = timestamps[a], values[a]
+        best_area = -1.0
+        best = start
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (values[j] - ay) - (ax - timestamps[j]) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                best = j
+        indices.append(best)
+        a = best
+
+    indices.append(n - 1)
+    return indices
+
+
+def minmax_buckets(timestamps: array, values: array, threshold: int) -> list[int]:
+    """
+    Keeps the min and max sample of each of threshold/2 equal-count buckets,
+    in time order. Suited to step data where a single spike matters.
+    """
+    n = len(timestamps)
+    if threshold >= n or threshold < 2:
+        return list(range(n))
+
+    buckets = threshold // 2
+    bucket_size = n / buckets
+    indices = []
+    for b in range(buckets):
+        start = int(b * bucket_size)
+        end = min(int((b + 1) * bucket_size), n)
+        if start >= end:
+            continue
+        lo = min(range(start, end), key=values.__getitem__)
+        hi = max(range(start, end), key=values.__getitem__)
+        indices.extend(sorted({lo, hi}))
+    return indices
+
+
+DOWNSAMPLERS = {
+    "lttb": lttb,
+    "minmax": minmax_buckets,
+}
+
+
+# =============================================================================
+# BINARY I/O
+# =============================================================================
+
+def write_series(path: str, header: dict, timestamps: array, values: array) -> None:
+    """Writes one series file (see module docstring for layout)."""
+    header = dict(header, version=FORMAT_VERSION, count=len(timestamps),
+                  timestamps="float64", values="float32")
+    header_bytes = json.dumps(header, separators=(",", ":")).encode()
+    header_bytes += b" " * (-(8 + len(header_bytes)) % 8)
+
+    if sys.byteorder == "big":
+        timestamps, values = array('d', timestamps), array('f', values)
+        timestamps.byteswap()
+        values.byteswap()
+
+    # Atomic: the frontend may be fetching the previous version
+    with atomic_writer(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        timestamps.tofile(f)
+        values.tofile(f)
+
+
+def read_series(path: str) -> tuple[dict, array, array]:
+    """Reads a series file back into (header, timestamps, values)."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:4] != MAGIC:
+        raise ValueError(f"Not a Billy series file: {path}")
+
+    (header_len,) = struct.unpack_from("<I", data, 4)
+    header = json.loads(data[8:8 + header_len])
+    offset = 8 + header_len
+    count = header["count"]
+
+    timestamps = array('d', data[offset:offset + 8 * count])
+    values = array('f', data[offset + 8 * count:offset + 12 * count])
+    if sys.byteorder == "big":
+        timestamps.byteswap()
+        values.byteswap()
+    return header, timestamps, values
+
+
+def export_timeseries(buffers: dict, out_dir: str, start_date: str | None = None, end_date: str | None = None,
+                      preview_points: int = PREVIEW_POINTS) -> dict:
+    """
+    Writes `<metric>.bin` (full resolution) and `<metric>.preview.bin`
+    (downsampled) for each metric, optionally restricted to a day range.
+    `buffers` must already be sorted (sort_series_buffers, once per parse).
+    Returns {metric: (full_count, preview_count)}.
+    """
+    written = {}
+
+    for metric, (unit, method) in SERIES_SPECS.items():
+        timestamps, values = slice_by_dates(buffers[metric], start_date, end_date)
+        if not timestamps:
+            continue
+
+        os.makedirs(out_dir, exist_ok=True)
+        header = {
+            "metric": metric,
+            "unit": unit,
+            "start": datetime.fromtimestamp(timestamps[0] / 1000, timezone.utc).isoformat(),
+            "end": datetime.fromtimestamp(timestamps[-1] / 1000, timezone.utc).isoformat(),
+        }
+        if start_date or end_date:
+            header["days"] = [start_date, end_date]
+        write_series(os.path.join(out_dir, f"{metric}.bin"), header, timestamps, values)
+
+        keep = DOWNSAMPLERS[method](timestamps, values, preview_points)
+        preview_header = dict(header, downsample={"method": method, "source_count": len(timestamps)})
+        write_series(
+            os.path.join(out_dir, f"{metric}.preview.bin"),
+            preview_header,
+            array('d', (timestamps[i] for i in keep)),
+            array('f', (values[i] for i in keep)),
+        )
+        written[metric] = (len(timestamps), len(keep))
+
+    return written
@@ -0,0 +1,473 @@
+"""
+vault.py - Indexed Query Engine for the Billy Vault
+
+Dataview answers "notes updated this week" or "days with low battery" inside
+Obsidian. This module answers the same questions from Python without reading
+every file on every query.
+
+Index (persisted to data/vault_index.json, refreshed incrementally by mtime):
+- Per note:     frontmatter, tags, headings, wikilink targets, bold/inline fields
+- Inverted:     tag -> notes, link target -> notes, heading -> notes
+- Values:       field -> distinct value -> notes (backs `where` and `contains`)
+- Range:        sorted (value, note) lists for `created` and `updated`, which
+                also serve `sort=` on those fields without sorting candidates
+
+Usage (from other modules):
+    from vault import VaultIndex
+    index = VaultIndex.open()
+    index.query(tags=["systems"], updated=("2025-12-08", "2025-12-14"), sort="updated", desc=True)
+    index.query(contains={"sleep_duration": "Low Battery"})
+
+open() costs one JSON load plus one stat per note; long-lived callers keep
+the index and call refresh(), so each query only touches the in-memory index.
+
+CLI: python src/vault.py --tag systems --updated-since 2025-12-08
+"""
+
+import argparse
+import heapq
+import json
+import os
+import re
+import sys
+import time
+from bisect import bisect_left, bisect_right, insort
+from itertools import islice
+
+# =============================================================================
+# IMPORT FIX: Ensure pipeline.py is importable
+# =============================================================================
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+from pipeline import CONCEPTS_DIR, OUTPUT_DIR
+from fileio import atomic_write
+
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+VAULT_ROOT = os.path.normpath(os.path.join(SCRIPT_DIR, '..'))
+VAULT_DIRS = [CONCEPTS_DIR, OUTPUT_DIR]
+INDEX_FILE = os.path.join(SCRIPT_DIR, '..', 'data', 'vault_index.json')
+INDEX_VERSION = 2
+
+RANGE_FIELDS = ("created", "updated")   # ISO strings: lexical order == time order
+POSTING_KEYS = ("tags", "links", "headings")
+
+FRONTMATTER_PATTERN = re.compile(r'\A---\s*\n(.*?)\n---\s*(?:\n|\Z)', re.DOTALL)
+HEADING_PATTERN = re.compile(r'^#{1,6}\s+(.+?)\s*#*\s*$', re.MULTILINE)
+TAG_PATTERN = re.compile(r'(?<![\w#/&])#([A-Za-z][\w/-]*)')
+WIKILINK_PATTERN = re.compile(r'!?\[\[([^\]|#^]+)')
+BOLD_FIELD_PATTERN = re.compile(r'^\s*[-*]?\s*\*\*([^*:]+):\*\*\s*(.+)$', re.MULTILINE)
+INLINE_FIELD_PATTERN = re.compile(r'^\s*[-*]?\s*([A-Za-z][\w -]*)::\s*(.+)$', re.MULTILINE)
+FENCED_CODE_PATTERN = re.compile(r'^```.*?^```', re.MULTILINE | re.DOTALL)
+
+
+# =============================================================================
+# NOTE PARSING
+# =============================================================================
+
+def field_key(label: str) -> str:
+    """'Sleep Duration' -> 'sleep_duration'"""
+    return re.sub(r'[^a-z0-9]+', '_', label.strip().lower()).strip('_')
+
+
+def value_text(value) -> str:
+    """Comparable text of a field value: lowercased, empty for missing/empty."""
+    return str(value or "").lower()
+
+
+def parse_scalar(value: str):
+    """Strips quotes; keeps everything else as a string (dates sort as ISO text)."""
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    return value
+
+
+def parse_frontmatter(text: str) -> dict:
+    """
+    Minimal YAML subset used by the vault: `key: value`, `key: [a, b]`
+    and block lists (`key:` followed by `  - item` lines).
+    """
+    data = {}
+    current_list = None
+
+    for line in text.splitlines():
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        stripped = line.strip()
+        if stripped.startswith("- ") and current_list is not None:
+            data[current_list].append(parse_scalar(stripped[2:]))
+            continue
+        if ":" not in line or line[0].isspace():
+            continue
+
+        key, _, value = line.partition(":")
+        key = key.strip()
+        value = value.strip()
+        current_list = None
+
+        if not value:
+            data[key] = []
+            current_list = key
+        elif value.startswith("[") and value.endswith("]"):
+            data[key] = [parse_scalar(v) for v in value[1:-1].split(",") if v.strip()]
+        else:
+            data[key] = parse_scalar(value)
+
+    return data
+
+
+def parse_note(content: str) -> dict:
+    """
+    Extracts the indexed facets of one note.
+    """
+    frontmatter = {}
+    body = content
+    match = FRONTMATTER_PATTERN.match(content)
+    if match:
+        frontmatter = parse_frontmatter(match.group(1))
+        body = content[match.end():]
+
+    # Code blocks would otherwise leak '#include' tags and '[[' links
+    prose = FENCED_CODE_PATTERN.sub("", body)
+
+    tags = frontmatter.get("tags", [])
+    if isinstance(tags, str):
+        tags = [t.strip() for t in re.split(r'[,\s]+', tags) if t.strip()]
+    tags = {t.lstrip("#").lower() for t in tags}
+    tags |= {t.lower() for t in TAG_PATTERN.findall(prose)}
+
+    fields = {}
+    for pattern in (BOLD_FIELD_PATTERN, INLINE_FIELD_PATTERN):
+        for label, value in pattern.findall(prose):
+            fields.setdefault(field_key(label), value.strip())
+
+    return {
+        "frontmatter": frontmatter,
+        "tags": sorted(tags),
+        "headings": HEADING_PATTERN.findall(prose),
+        "links": sorted({link.strip() for link in WIKILINK_PATTERN.findall(prose)}),
+        "fields": fields,
+    }
+
+
+# =============================================================================
+# INDEX
+# =============================================================================
+
+class VaultIndex:
+    """
+    Persistent note index with inverted postings and sorted range lists.
+    All mutation goes through `refresh()`; queries never touch the disk.
+    """
+
+    def __init__(self, index_file: str = INDEX_FILE, directories: list[str] | None = None, root: str = VAULT_ROOT):
+        self.index_file = index_file
+        self.directories = directories or VAULT_DIRS
+        self.root = root
+        self.notes: dict[str, dict] = {}
+        self.postings: dict[str, dict[str, set[str]]] = {key: {} for key in POSTING_KEYS}
+        self.values: dict[str, dict[str, set[str]]] = {}
+        self.ranges: dict[str, list[list[str]]] = {field: [] for field in RANGE_FIELDS}
+        self.unranged: dict[str, set[str]] = {field: set() for field in RANGE_FIELDS}
+        self.dirty = False
+
+    @classmethod
+    def open(cls, index_file: str = INDEX_FILE, directories: list[str] | None = None, root: str = VAULT_ROOT) -> "VaultIndex":
+        """Loads the persisted index, refreshes changed notes, saves if anything changed."""
+        index = cls(index_file, directories, root)
+        index.load()
+        index.refresh()
+        if index.dirty:
+            index.save()
+        return index
+
+    # --- Persistence -----------------------------------------------------
+
+    def load(self) -> None:
+        try:
+            with open(self.index_file, 'r') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if data.get("version") != INDEX_VERSION:
+            return
+
+        self.notes = data["notes"]
+        self.postings = {
+            key: {term: set(paths) for term, paths in data["postings"][key].items()}
+            for key in POSTING_KEYS
+        }
+        self.values = {
+            key: {value: set(paths) for value, paths in values.items()}
+            for key, values in data["values"].items()
+        }
+        self.ranges = data["ranges"]
+        self.unranged = {field: set(paths) for field, paths in data["unranged"].items()}
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+        data = {
+            "version": INDEX_VERSION,
+            "notes": self.notes,
+            "postings": {
+                key: {term: sorted(paths) for term, paths in postings.items()}
+                for key, postings in self.postings.items()
+            },
+            "values": {
+                key: {value: sorted(paths) for value, paths in values.items()}
+                for key, values in self.values.items()
+            },
+            "ranges": self.ranges,
+            "unranged": {field: sorted(paths) for field, paths in self.unranged.items()},
+        }
+        atomic_write(self.index_file, json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+        self.dirty = False
+
+    # --- Incremental maintenance -----------------------------------------
+
+    def scan(self) -> dict[str, tuple[int, int]]:
+        """Returns {relpath: (mtime_ns, size)} for every .md file under the vault dirs."""
+        found = {}
+        # Relative paths are built by joining, not os.path.relpath per file
+        stack = [(d, os.path.relpath(d, self.root)) for d in self.directories if os.path.isdir(d)]
+        while stack:
+            directory, rel_dir = stack.pop()
+            prefix = "" if rel_dir == os.curdir else rel_dir + os.sep
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, prefix + entry.name))
+                    elif entry.name.endswith(".md"):
+                        stat = entry.stat()
+                        found[prefix + entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return found
+
+    def refresh(self) -> tuple[int, int]:
+        """
+        Re-parses only notes whose (mtime, size) changed and drops deleted ones.
+        Returns (updated, removed).
+        """
+        found = self.scan()
+        removed = [path for path in self.notes if path not in found]
+        for path in removed:
+            self._remove(path)
+
+        updated = 0
+        for path, (mtime_ns, size) in found.items():
+            note = self.notes.get(path)
+            if note and note["mtime_ns"] == mtime_ns and note["size"] == size:
+                continue
+            try:
+                with open(os.path.join(self.root, path), 'r', encoding='utf-8') as f:
+                    parsed = parse_note(f.read())
+            except (OSError, UnicodeDecodeError):
+                continue
+            if note:
+                self._remove(path)
+            self._add(path, {"mtime_ns": mtime_ns, "size": size, **parsed})
+            updated += 1
+
+        if updated or removed:
+            self.dirty = True
+        return updated, len(removed)
+
+    def _add(self, path: str, note: dict) -> None:
+        self.notes[path] = note
+        for key in POSTING_KEYS:
+            for term in note[key]:
+                # Postings are case-insensitive
+                self.postings[key].setdefault(term.lower(), set()).add(path)
+        for key, value in self.note_values(note).items():
+            self.values.setdefault(key, {}).setdefault(value, set()).add(path)
+        for field in RANGE_FIELDS:
+            value = note["frontmatter"].get(field)
+            if isinstance(value, str):
+                insort(self.ranges[field], [value, path])
+            else:
+                self.unranged[field].add(path)
+
+    def _remove(self, path: str) -> None:
+        note = self.notes.pop(path)
+        for key in POSTING_KEYS:
+            for term in note[key]:
+                term = term.lower()
+                paths = self.postings[key].get(term)
+                if paths is not None:
+                    paths.discard(path)
+                    if not paths:
+                        del self.postings[key][term]
+        for key, value in self.note_values(note).items():
+            paths = self.values[key][value]
+            paths.discard(path)
+            if not paths:
+                del self.values[key][value]
+                if not self.values[key]:
+                    del self.values[key]
+        for field in RANGE_FIELDS:
+            value = note["frontmatter"].get(field)
+            if isinstance(value, str):
+                entries = self.ranges[field]
+                i = bisect_left(entries, [value, path])
+                if i < len(entries) and entries[i] == [value, path]:
+                    del entries[i]
+            else:
+                self.unranged[field].discard(path)
+
+    @staticmethod
+    def note_values(note: dict) -> dict[str, str]:
+        """Lowercased text of every get_value() key - the form `where`/`contains` compare."""
+        merged = {**note["fields"], **note["frontmatter"]}
+        return {key: value_text(value) for key, value in merged.items()}
+
+    # --- Queries ---------------------------------------------------------
+
+    def with_tag(self, tag: str) -> set[str]:
+        return set(self.postings["tags"].get(tag.lstrip("#").lower(), ()))
+
+    def linking_to(self, target: str) -> set[str]:
+        return set(self.postings["links"].get(target.lower(), ()))
+
+    def with_heading(self, heading: str) -> set[str]:
+        return set(self.postings["headings"].get(heading.lower(), ()))
+
+    def in_range(self, field: str, start: str | None = None, end: str | None = None) -> list[str]:
+        """
+        Notes whose `field` lies in [start, end], in ascending order.
+        Bounds are prefixes: end="2025-12-14" includes "2025-12-14T23:59".
+        """
+        entries = self.ranges[field]
+        lo = bisect_left(entries, [start]) if start else 0
+        hi = bisect_right(entries, [end + "\uffff"]) if end else len(entries)
+        return [path for _, path in entries[lo:hi]]
+
+    def with_value(self, key: str, value) -> set[str]:
+        """Notes whose `key` compares equal to `value`, ignoring case."""
+        return set(self.values.get(key, {}).get(value_text(value), ()))
+
+    def containing(self, key: str, text) -> set[str]:
+        """Notes whose `key` contains `text` (case-insensitive), via distinct values."""
+        text = value_text(text)
+        paths = set()
+        for value, value_paths in self.values.get(key, {}).items():
+            if text in value:
+                paths |= value_paths
+        return paths
+
+    def query(self, tags: list[str] | None = None, links_to: str | None = None, heading: str | None = None,
+              created: tuple[str | None, str | None] | None = None,
+              updated: tuple[str | None, str | None] | None = None,
+              where: dict | None = None, contains: dict | None = None,
+              sort: str | None = None, desc: bool = False, limit: int | None = None) -> list[dict]:
+        """
+        Combines filters (AND). Every filter narrows the candidate set through
+        an index; `where` (exact) then re-checks case on the survivors only.
+        Sorting by `created`/`updated` walks the pre-sorted range lists and stops
+        at `limit`; other sort keys sort the candidates.
+        Returns [{"path", "frontmatter", "tags", "fields", ...}] records.
+        """
+        candidates: set[str] | None = None
+
+        def narrow(paths) -> None:
+            nonlocal candidates
+            paths = set(paths)
+            candidates = paths if candidates is None else candidates & paths
+
+        for tag in tags or []:
+            narrow(self.with_tag(tag))
+        if links_to:
+            narrow(self.linking_to(links_to))
+        if heading:
+            narrow(self.with_heading(heading))
+        if created:
+            narrow(self.in_range("created", *created))
+        if updated:
+            narrow(self.in_range("updated", *updated))
+        for key, value in (where or {}).items():
+            narrow(self.with_value(key, value))
+        for key, text in (contains or {}).items():
+            if value_text(text):
+                narrow(self.containing(key, text))
+
+        paths = self._ordered(candidates, sort, desc)
+        if where:
+            paths = (p for p in paths if all(self.get_value(self.notes[p], k) == v for k, v in where.items()))
+        return [{"path": path, **self.notes[path]} for path in islice(paths, limit or None)]
+
+    def _ordered(self, candidates: set[str] | None, sort: str | None, desc: bool):
+        """Yields candidate paths in result order, lazily where the index allows."""
+        pool = self.notes.keys() if candidates is None else candidates
+        if not sort:
+            return iter(sorted(pool))
+
+        def sort_key(path: str) -> tuple[str, str]:
+            return str(self.get_value(self.notes[path], sort) or ""), path
+
+        # A handful of candidates sorts faster than walking the whole range list
+        entries = self.ranges.get(sort)
+        if entries is None or (candidates is not None and len(candidates) * 8 < len(entries)):
+            return iter(sorted(pool, key=sort_key, reverse=desc))
+
+        # Notes without a string frontmatter value aren't in the range list;
+        # merge them in by the same key so the order matches a full sort
+        ranged = ((value, path) for value, path in (reversed(entries) if desc else entries)
+                  if candidates is None or path in candidates)
+        unranged = self.unranged[sort] if candidates is None else self.unranged[sort] & candidates
+        rest = sorted(map(sort_key, unranged), reverse=desc)
+        return (path for _, path in heapq.merge(ranged, rest, reverse=desc))
+
+    @staticmethod
+    def get_value(note: dict, key: str):
+        """Frontmatter first, then body fields ('**Sleep Duration:**' -> sleep_duration)."""
+        if key in note["frontmatter"]:
+            return note["frontmatter"][key]
+        return note["fields"].get(key)
+
+
+# =============================================================================
+# ENTRY POINT
+# =============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the Billy vault index.")
+    parser.add_argument("--tag", action="append", help="Require tag (repeatable)")
+    parser.add_argument("--links-to", help="Notes linking to [[TARGET]]")
+    parser.add_argument("--heading", help="Notes with this heading")
+    parser.add_argument("--updated-since", help="updated >= DATE")
+    parser.add_argument("--updated-until", help="updated <= DATE")
+    parser.add_argument("--contains", nargs=2, action="append", metavar=("FIELD", "TEXT"), help="Field contains text")
+    parser.add_argument("--sort", default="updated")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = VaultIndex.open()
+    opened = time.perf_counter()
+
+    updated_range = None
+    if args.updated_since or args.updated_until:
+        updated_range = (args.updated_since, args.updated_until)
+
+    results = index.query(
+        tags=args.tag,
+        links_to=args.links_to,
+        heading=args.heading,
+        updated=updated_range,
+        contains=dict(args.contains) if args.contains else None,
+        sort=args.sort,
+        desc=True,
+        limit=args.limit,
+    )
+    finished = time.perf_counter()
+
+    for note in results:
+        print(f"{note['frontmatter'].get('updated', ''):<17} {note['path']}")
+    print(f"\n{len(results)} of {len(index.notes)} notes | open {1000 * (opened - started):.1f}ms | query {1000 * (finished - opened):.2f}ms")
@@ -0,0 +1,325 @@
+"""
+watch.py - Daemon Mode for Billy
+
+Stays resident and re-runs the pipeline when its inputs change:
+- data/                 New Apple Health exports      -> full pipeline run
+- concepts/, daily notes Knowledge nodes added/removed -> Knowledge XP refresh
+
+Uses Linux inotify (via ctypes, no extra dependencies) and falls back to
+mtime polling elsewhere. Bursts of events are debounced into a single run,
+and an export is only parsed once it has stopped growing. Per-day aggregates
+stay in memory between runs: days the baseline already absorbed are skipped
+while streaming the export, so a new export only costs the days it adds.
+A failed run is logged and retried on the next change. Blocking reads keep
+idle CPU near zero.
+
+Usage: python src/watch.py [--poll] [--timeseries]
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+import traceback
+
+# =============================================================================
+# IMPORT FIX: Ensure pipeline.py is importable
+# =============================================================================
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+import pipeline
+from clock import get_date_key, get_timestamp
+
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+DATA_DIR = os.path.dirname(pipeline.XML_FILE)
+
+DEBOUNCE_SECONDS = 1.0      # Quiet period before a burst is flushed
+SETTLE_SECONDS = 2.0        # Export must keep the same (mtime, size) this long
+POLL_INTERVAL = 2.0         # Fallback scan interval (no inotify)
+
+# inotify constants (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_ISDIR = 0x40000000
+
+# IN_CREATE is only acted on for directories: a file being copied in sends
+# CREATE first and then nothing until CLOSE_WRITE, so reacting to CREATE
+# would flush the debounce while the file is still half-written.
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+# =============================================================================
+# EVENT CLASSIFICATION
+# =============================================================================
+
+def classify_path(path: str) -> str | None:
+    """
+    Maps a changed path to the work it requires:
+    "export" (re-parse health data), "notes" (refresh XP) or None (ignore).
+    Our own caches in data/ (xp_cache.json, baselines.json) are ignored.
+    """
+    path = os.path.abspath(path)
+    if path.startswith(os.path.abspath(DATA_DIR) + os.sep):
+        return "export" if path.endswith(".xml") else None
+    if path.endswith(".md"):
+        return "notes"
+    return None
+
+
+# =============================================================================
+# WATCHERS
+# =============================================================================
+
+class InotifyWatcher:
+    """
+    Recursive inotify watcher. `wait(timeout)` blocks until events arrive
+    and returns the changed paths.
+    """
+
+    def __init__(self, directories: list[str]):
+        libc_name = ctypes.util.find_library("c")
+        if not sys.platform.startswith("linux") or not libc_name:
+            raise OSError("inotify unavailable")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches: dict[int, str] = {}
+        for directory in directories:
+            for root, _, _ in os.walk(directory):
+                self._add_watch(root)
+
+    def _add_watch(self, directory: str) -> None:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd >= 0:
+            self.watches[wd] = directory
+
+    def _watch_tree(self, directory: str) -> list[str]:
+        """Watches every subdirectory of a new directory; returns the files already in it."""
+        found = []
+        for root, dirs, files in os.walk(directory):
+            for d in dirs:
+                self._add_watch(os.path.join(root, d))
+            found.extend(os.path.join(root, f) for f in files)
+        return found
+
+    def wait(self, timeout: float | None) -> list[str]:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        paths = []
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, name_len = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = buffer[offset:offset + name_len].rstrip(b"\0").decode(errors="replace")
+            offset += name_len
+
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_watch(path)
+                    # Files copied in before the watch existed sent no events
+                    paths.extend(self._watch_tree(path))
+                continue
+            if mask & IN_CREATE:
+                continue
+            paths.append(path)
+        return paths
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """
+    Portable fallback: compares (mtime, size) snapshots every POLL_INTERVAL.
+    """
+
+    def __init__(self, directories: list[str]):
+        self.directories = directories
+        self.snapshot = self._scan()
+
+    def _scan(self) -> dict[str, tuple[float, int]]:
+        snapshot = {}
+        for directory in self.directories:
+            for root, _, files in os.walk(directory):
+                for f in files:
+                    path = os.path.join(root, f)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    snapshot[path] = (stat.st_mtime, stat.st_size)
+        return snapshot
+
+    def wait(self, timeout: float | None) -> list[str]:
+        time.sleep(POLL_INTERVAL if timeout is None else min(timeout, POLL_INTERVAL))
+        current = self._scan()
+        changed = [p for p, sig in current.items() if self.snapshot.get(p) != sig]
+        changed += [p for p in self.snapshot if p not in current]
+        self.snapshot = current
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+def create_watcher(directories: list[str], force_poll: bool = False):
+    """Returns an inotify watcher where available, polling otherwise."""
+    if not force_poll:
+        try:
+            return InotifyWatcher(directories)
+        except OSError:
+            pass
+    return PollingWatcher(directories)
+
+
+# =============================================================================
+# RUNS
+# =============================================================================
+
+def export_signature(xml_file: str) -> tuple[float, int] | None:
+    """(mtime, size) of the export, or None if missing."""
+    try:
+        stat = os.stat(xml_file)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime, stat.st_size
+
+
+def wait_until_settled(xml_file: str) -> tuple[float, int] | None:
+    """
+    Blocks until the export's signature stops changing for SETTLE_SECONDS,
+    so a slow copy (or the polling backend) never hands us a partial file.
+    """
+    signature = export_signature(xml_file)
+    while signature is not None:
+        time.sleep(SETTLE_SECONDS)
+        current = export_signature(xml_file)
+        if current == signature:
+            break
+        signature = current
+    return signature
+
+
+def refresh_knowledge_xp() -> None:
+    """Recounts nodes and patches today's note in place (if it exists)."""
+    knowledge_xp = pipeline.get_knowledge_xp()
+    changed = pipeline.update_knowledge_line(get_date_key(), knowledge_xp)
+    status = "note updated" if changed else "no change"
+    print(f"📚 Knowledge Base: {knowledge_xp[0]} nodes ({'+' if knowledge_xp[1] >= 0 else ''}{knowledge_xp[1]} today) - {status}")
+
+
+def run_batch(kinds: set[str], state: dict) -> None:
+    """
+    Executes the minimum work for a debounced burst of events.
+    A full run already refreshes XP, so "notes" is dropped when "export" is set.
+    `state["export_signature"]` is only recorded after a successful parse;
+    `state["warm"]` carries per-day aggregates from one run to the next.
+    """
+    started = time.perf_counter()
+
+    if "export" in kinds:
+        signature = wait_until_settled(pipeline.XML_FILE)
+        if signature is None:
+            print(f"⚠️  Export missing: {pipeline.XML_FILE}")
+        elif signature == state.get("export_signature"):
+            print("⏭  Export unchanged, skipping re-parse")
+            kinds = kinds | {"notes"}
+        else:
+            pipeline.parse_health_data(pipeline.XML_FILE, timeseries_dir=state.get("timeseries_dir"), warm=state["warm"])
+            state["export_signature"] = signature
+            kinds = kinds - {"notes"}
+
+    if "notes" in kinds:
+        refresh_knowledge_xp()
+
+    print(f"⏱  Done in {time.perf_counter() - started:.2f}s\n")
+
+
+# =============================================================================
+# MAIN LOOP
+# =============================================================================
+
+def watch(force_poll: bool = False, timeseries: bool = False) -> None:
+    """
+    Blocks forever, flushing debounced event bursts into pipeline runs.
+    `timeseries` adds the series export to each run (and disables day reuse).
+    """
+    directories = [d for d in (DATA_DIR, pipeline.CONCEPTS_DIR, pipeline.OUTPUT_DIR) if os.path.isdir(d)]
+    watcher = create_watcher(directories, force_poll)
+    backend = "inotify" if isinstance(watcher, InotifyWatcher) else "polling"
+
+    print(f"👀 Billy watch mode ({backend}) started {get_timestamp()}")
+    for directory in directories:
+        print(f"   - {os.path.normpath(directory)}")
+    print()
+
+    # Seeded from the last run on disk, so even the first change is warm
+    state = {
+        "export_signature": export_signature(pipeline.XML_FILE),
+        "warm": {"days": pipeline.load_daily_metrics()},
+        "timeseries_dir": pipeline.TIMESERIES_DIR if timeseries else None,
+    }
+    pending: set[str] = set()
+    last_event = 0.0
+
+    try:
+        while True:
+            # Block indefinitely when idle; only wake for the debounce deadline
+            timeout = None
+            if pending:
+                timeout = max(0.0, last_event + DEBOUNCE_SECONDS - time.monotonic())
+
+            paths = watcher.wait(timeout)
+            kinds = {k for k in map(classify_path, paths) if k}
+            if kinds:
+                pending |= kinds
+                last_event = time.monotonic()
+                continue
+
+            if pending and time.monotonic() - last_event >= DEBOUNCE_SECONDS:
+                batch, pending = pending, set()
+                print(f"🔄 Change detected ({', '.join(sorted(batch))})")
+                try:
+                    run_batch(batch, state)
+                except Exception:
+                    # Keep the daemon alive; the next event retries the run
+                    traceback.print_exc()
+                    print(f"❌ Run failed at {get_timestamp()}, waiting for the next change\n")
+    except KeyboardInterrupt:
+        print("\n[watch] Stopped.")
+    finally:
+        watcher.close()
+
+
+# =============================================================================
+# ENTRY POINT
+# =============================================================================
+
+if __name__ == "__main__":
+    watch(force_poll="--poll" in sys.argv, timeseries="--timeseries" in sys.argv)